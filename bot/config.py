@@ -1,9 +1,13 @@
 import os
 from pathlib import Path
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from .env file, once per process environment
+# (re-imports and child processes skip both the import and the file parse)
+if os.getenv("DOTENV_LOADED") != "1":
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    os.environ.setdefault("DOTENV_LOADED", "1")
 
 # Base directory
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -15,6 +19,7 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 # Helius configuration
 HELIUS_API_KEY = os.getenv("HELIUS_API_KEY")
 HELIUS_API_URL = "https://api.helius.xyz/v0"
+HELIUS_RPC_URL = "https://mainnet.helius-rpc.com/"
 
 # Webhook configuration
 WEBHOOK_URL = os.getenv("WEBHOOK_URL", "http://localhost:8000")
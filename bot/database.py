@@ -1,34 +1,211 @@
+import asyncio
+import functools
 import aiosqlite
+from contextlib import asynccontextmanager
 from pathlib import Path
 from datetime import datetime
 from typing import Optional
 
 from .config import DATABASE_PATH
 
+# SQL for the webhook hot path, kept as constants so the text is identical
+# on every call and always hits sqlite3's prepared statement cache
+_TRANSACTION_EXISTS_SQL = "SELECT EXISTS(SELECT 1 FROM transactions WHERE signature = ? LIMIT 1)"
+
+# Max rows per multi-row INSERT (up to 7 bound parameters each)
+_INSERT_CHUNK_SIZE = 64
+
+
+@functools.lru_cache(maxsize=None)
+def _insert_transactions_sql(row_count: int) -> str:
+    """Multi-row INSERT OR IGNORE that reports the signatures actually inserted."""
+    values = ", ".join(["(?, ?, ?, ?, ?, ?, ?)"] * row_count)
+    return f"""INSERT OR IGNORE INTO transactions
+        (wallet_address, signature, type, token_address, token_symbol, amount, usd_value)
+        VALUES {values}
+        RETURNING signature"""
+
+
+@functools.lru_cache(maxsize=None)
+def _save_token_infos_sql(row_count: int) -> str:
+    """Multi-row INSERT OR REPLACE into the token metadata cache."""
+    values = ", ".join(["(?, ?, ?, ?)"] * row_count)
+    return f"""INSERT OR REPLACE INTO token_info_cache (address, symbol, name, decimals)
+        VALUES {values}"""
+
+# Transactions are keyed by signature in a WITHOUT ROWID table, so each
+# insert writes one B-tree instead of a rowid table plus a UNIQUE index
+_CREATE_TRANSACTIONS_SQL = """
+    CREATE TABLE IF NOT EXISTS transactions (
+        signature TEXT PRIMARY KEY,
+        wallet_address TEXT NOT NULL,
+        type TEXT NOT NULL,
+        token_address TEXT,
+        token_symbol TEXT,
+        amount REAL,
+        usd_value REAL,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ) WITHOUT ROWID
+"""
+
+
+class TransactionBuffer:
+    """
+    Collects transaction rows and writes them to the database in batches.
+
+    Rows are flushed every `flush_interval` seconds, or as soon as `max_rows`
+    are pending, so a burst of webhook events shares a single commit.
+    Each added row gets a future that resolves to True if it was inserted
+    or False if its signature was already stored.
+    """
+
+    def __init__(self, database: "Database", max_rows: int = 64, flush_interval: float = 0.05):
+        self._database = database
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self._rows: list[tuple] = []
+        self._futures: list[asyncio.Future] = []
+        self._has_rows = asyncio.Event()
+        self._full = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start the background flush task."""
+        self._closing = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Flush pending rows and stop the background task."""
+        self._closing = True
+        self._has_rows.set()
+        self._full.set()
+        if self._task:
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def add(self, row: tuple) -> asyncio.Future:
+        """Queue a row for insertion."""
+        future = asyncio.get_running_loop().create_future()
+        self._rows.append(row)
+        self._futures.append(future)
+        self._has_rows.set()
+        if len(self._rows) >= self.max_rows:
+            self._full.set()
+        return future
+
+    async def flush(self):
+        """Write all pending rows in one transaction."""
+        rows, futures = self._rows, self._futures
+        self._rows, self._futures = [], []
+        self._has_rows.clear()
+        self._full.clear()
+
+        if not rows:
+            return
+
+        try:
+            results = await self._database._insert_transactions(rows)
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for future, added in zip(futures, results):
+            if not future.done():
+                future.set_result(added)
+
+    async def _run(self):
+        while True:
+            await self._has_rows.wait()
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            await self.flush()
+            if self._closing:
+                return
+
 
 class Database:
     def __init__(self, db_path: str = DATABASE_PATH):
         self.db_path = db_path
         self._connection: Optional[aiosqlite.Connection] = None
+        self._tx_buffer: Optional[TransactionBuffer] = None
+        # Every write holds this lock. All writes share one connection, so a
+        # single-statement write running between BEGIN and COMMIT would join
+        # (and roll back with) another caller's transaction()
+        self._write_lock = asyncio.Lock()
+
+        # Wallets change at human speed but are read on every webhook event,
+        # so they are served from memory. Ordered oldest -> newest.
+        self._wallet_cache: dict[str, aiosqlite.Row] = {}
+        # Newest-first snapshot for get_wallets(), rebuilt after any change
+        self._wallet_snapshot: Optional[tuple[aiosqlite.Row, ...]] = None
 
     async def connect(self):
         """Initialize database connection and create tables."""
         # Ensure directory exists
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
 
-        self._connection = await aiosqlite.connect(self.db_path)
+        # Autocommit mode: single statements commit on their own and
+        # multi-statement writes are grouped explicitly via transaction()
+        self._connection = await aiosqlite.connect(
+            self.db_path, isolation_level=None, cached_statements=256
+        )
         self._connection.row_factory = aiosqlite.Row
+        await self._configure()
+        await self._migrate_transactions()
         await self._create_tables()
+        await self._load_wallets()
+
+        self._tx_buffer = TransactionBuffer(self)
+        self._tx_buffer.start()
+
+    async def _configure(self):
+        """
+        Tune SQLite for a write-heavy single-process workload.
+
+        WAL lets commits append to the log instead of rewriting pages, and
+        synchronous=NORMAL only fsyncs at checkpoints, which is still safe
+        against corruption in WAL mode. All reads and writes go through this
+        one connection; aiosqlite serializes them on its worker thread, so
+        no pool is needed.
+        """
+        await self._connection.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA cache_size=-64000;
+            PRAGMA mmap_size=268435456;
+            PRAGMA busy_timeout=5000;
+        """)
 
     async def close(self):
         """Close database connection."""
+        if self._tx_buffer:
+            await self._tx_buffer.stop()
+            self._tx_buffer = None
         if self._connection:
             await self._connection.close()
             self._connection = None
+        self._wallet_cache.clear()
+        self._wallet_snapshot = None
+
+    async def _load_wallets(self):
+        """Populate the in-memory wallet cache from the database."""
+        cursor = await self._connection.execute(
+            "SELECT * FROM wallets ORDER BY created_at, id"
+        )
+        self._wallet_cache = {row["address"]: row for row in await cursor.fetchall()}
+        self._wallet_snapshot = None
 
     async def _create_tables(self):
         """Create database tables if they don't exist."""
-        await self._connection.executescript("""
+        await self._connection.executescript(f"""
             CREATE TABLE IF NOT EXISTS wallets (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 address TEXT UNIQUE NOT NULL,
@@ -37,86 +214,139 @@ class Database:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             );
 
-            CREATE TABLE IF NOT EXISTS transactions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                wallet_address TEXT NOT NULL,
-                signature TEXT UNIQUE NOT NULL,
-                type TEXT NOT NULL,
-                token_address TEXT,
-                token_symbol TEXT,
-                amount REAL,
-                usd_value REAL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
+            {_CREATE_TRANSACTIONS_SQL};
+
+            CREATE TABLE IF NOT EXISTS token_info_cache (
+                address TEXT PRIMARY KEY,
+                symbol TEXT NOT NULL,
+                name TEXT NOT NULL,
+                decimals INTEGER NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            ) WITHOUT ROWID;
 
             CREATE INDEX IF NOT EXISTS idx_wallets_address ON wallets(address);
-            CREATE INDEX IF NOT EXISTS idx_transactions_wallet ON transactions(wallet_address);
-            CREATE INDEX IF NOT EXISTS idx_transactions_signature ON transactions(signature);
+            CREATE INDEX IF NOT EXISTS idx_tx_wallet_ts ON transactions(wallet_address, timestamp DESC);
+
+            -- Superseded by idx_tx_wallet_ts, which covers wallet_address lookups too
+            DROP INDEX IF EXISTS idx_transactions_wallet;
         """)
-        await self._connection.commit()
+
+    async def _migrate_transactions(self):
+        """
+        Rebuild a transactions table from the old schema (rowid id plus a
+        UNIQUE signature) as the signature-keyed WITHOUT ROWID table,
+        copying existing rows. No-op for new or already migrated databases.
+        """
+        cursor = await self._connection.execute("PRAGMA table_info(transactions)")
+        columns = {row["name"] for row in await cursor.fetchall()}
+        if "id" not in columns:
+            return
+
+        async with self.transaction() as conn:
+            await conn.execute("ALTER TABLE transactions RENAME TO transactions_old")
+            await conn.execute(_CREATE_TRANSACTIONS_SQL)
+            await conn.execute("""
+                INSERT OR IGNORE INTO transactions
+                    (signature, wallet_address, type, token_address, token_symbol, amount, usd_value, timestamp)
+                SELECT signature, wallet_address, type, token_address, token_symbol, amount, usd_value, timestamp
+                FROM transactions_old
+            """)
+            # Also drops the old table's indexes; _create_tables recreates the ones still used
+            await conn.execute("DROP TABLE transactions_old")
+
+    @asynccontextmanager
+    async def transaction(self):
+        """
+        Group several writes into a single transaction and commit.
+        Rolls back if the block raises.
+        """
+        async with self._write_lock:
+            await self._connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._connection
+            except BaseException:
+                await self._connection.rollback()
+                raise
+            await self._connection.commit()
 
     async def add_wallet(
         self, address: str, name: str, webhook_id: Optional[str] = None
     ) -> bool:
         """Add a wallet to track. Returns True if added, False if already exists."""
-        try:
-            await self._connection.execute(
-                "INSERT INTO wallets (address, name, helius_webhook_id) VALUES (?, ?, ?)",
-                (address, name, webhook_id),
-            )
-            await self._connection.commit()
+        async with self._write_lock:
+            try:
+                rows = await self._connection.execute_fetchall(
+                    "INSERT INTO wallets (address, name, helius_webhook_id) VALUES (?, ?, ?) RETURNING *",
+                    (address, name, webhook_id),
+                )
+            except aiosqlite.IntegrityError:
+                return False
+            self._wallet_cache[address] = rows[0]
+            self._wallet_snapshot = None
             return True
-        except aiosqlite.IntegrityError:
-            return False
 
     async def remove_wallet(self, address: str) -> Optional[str]:
         """Remove a wallet. Returns the webhook_id if it existed."""
-        cursor = await self._connection.execute(
-            "SELECT helius_webhook_id FROM wallets WHERE address = ?", (address,)
-        )
-        row = await cursor.fetchone()
-
-        if row:
-            webhook_id = row["helius_webhook_id"]
-            await self._connection.execute(
-                "DELETE FROM wallets WHERE address = ?", (address,)
+        async with self._write_lock:
+            # Fetch all rows so the statement completes and autocommits now
+            rows = await self._connection.execute_fetchall(
+                "DELETE FROM wallets WHERE address = ? RETURNING helius_webhook_id", (address,)
             )
-            await self._connection.commit()
-            return webhook_id
-        return None
+            self._wallet_cache.pop(address, None)
+            self._wallet_snapshot = None
+        return rows[0]["helius_webhook_id"] if rows else None
 
-    async def get_wallet(self, address: str) -> Optional[dict]:
+    async def get_wallet(self, address: str) -> Optional[aiosqlite.Row]:
         """Get a single wallet by address."""
-        cursor = await self._connection.execute(
-            "SELECT * FROM wallets WHERE address = ?", (address,)
-        )
-        row = await cursor.fetchone()
-        return dict(row) if row else None
+        return self._wallet_cache.get(address)
 
-    async def get_wallets(self) -> list[dict]:
-        """Get all tracked wallets."""
-        cursor = await self._connection.execute(
-            "SELECT * FROM wallets ORDER BY created_at DESC"
-        )
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+    @property
+    def tracked_addresses(self):
+        """Live, set-like view of the tracked wallet addresses."""
+        return self._wallet_cache.keys()
+
+    async def get_all_addresses(self) -> list[str]:
+        """Get the addresses of all tracked wallets."""
+        return list(self._wallet_cache)
+
+    async def get_wallets_by_addresses(self, addresses: list[str]) -> dict[str, aiosqlite.Row]:
+        """Get the tracked wallets among `addresses`, keyed by address."""
+        cache = self._wallet_cache
+        return {address: cache[address] for address in addresses if address in cache}
+
+    async def get_wallets(self) -> tuple[aiosqlite.Row, ...]:
+        """
+        Get all tracked wallets.
+        Rows support key access (row["name"]); call dict(row) only where a real dict is needed.
+        The same immutable snapshot is returned until the wallets change.
+        """
+        if self._wallet_snapshot is None:
+            # Newest first, matching ORDER BY created_at DESC
+            self._wallet_snapshot = tuple(reversed(self._wallet_cache.values()))
+        return self._wallet_snapshot
 
     async def rename_wallet(self, address: str, new_name: str) -> bool:
         """Rename a wallet. Returns True if updated, False if not found."""
-        cursor = await self._connection.execute(
-            "UPDATE wallets SET name = ? WHERE address = ?", (new_name, address)
+        return await self._update_wallet(
+            "UPDATE wallets SET name = ? WHERE address = ? RETURNING *", (new_name, address)
         )
-        await self._connection.commit()
-        return cursor.rowcount > 0
 
     async def update_wallet_webhook_id(self, address: str, webhook_id: str) -> bool:
         """Update the webhook ID for a wallet."""
-        cursor = await self._connection.execute(
-            "UPDATE wallets SET helius_webhook_id = ? WHERE address = ?",
+        return await self._update_wallet(
+            "UPDATE wallets SET helius_webhook_id = ? WHERE address = ? RETURNING *",
             (webhook_id, address),
         )
-        await self._connection.commit()
-        return cursor.rowcount > 0
+
+    async def _update_wallet(self, sql: str, params: tuple) -> bool:
+        """Run a wallet UPDATE ... RETURNING * and refresh the cached row."""
+        async with self._write_lock:
+            rows = await self._connection.execute_fetchall(sql, params)
+            for row in rows:
+                # Reassigning an existing key keeps its position in the cache
+                self._wallet_cache[row["address"]] = row
+                self._wallet_snapshot = None
+        return bool(rows)
 
     async def add_transaction(
         self,
@@ -128,22 +358,44 @@ class Database:
         amount: Optional[float] = None,
         usd_value: Optional[float] = None,
     ) -> bool:
-        """Add a transaction record. Returns True if added, False if duplicate."""
-        try:
-            await self._connection.execute(
-                """INSERT INTO transactions
-                   (wallet_address, signature, type, token_address, token_symbol, amount, usd_value)
-                   VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                (wallet_address, signature, tx_type, token_address, token_symbol, amount, usd_value),
-            )
-            await self._connection.commit()
-            return True
-        except aiosqlite.IntegrityError:
-            return False
+        """
+        Add a transaction record. Returns True if added, False if duplicate.
+        The row is written by the transaction buffer as part of a batch.
+        """
+        return await self._tx_buffer.add(
+            (wallet_address, signature, tx_type, token_address, token_symbol, amount, usd_value)
+        )
+
+    async def _insert_transactions(self, rows: list[tuple]) -> list[bool]:
+        """
+        Insert a batch of transaction rows.
+        Returns, per row, whether it was newly inserted.
+
+        Each chunk is one multi-row INSERT ... RETURNING statement, which is
+        atomic on its own and costs a single hop to aiosqlite's worker thread
+        (instead of BEGIN, a duplicate check, the insert and COMMIT).
+        """
+        inserted = set()
+        for start in range(0, len(rows), _INSERT_CHUNK_SIZE):
+            chunk = rows[start:start + _INSERT_CHUNK_SIZE]
+            params = [value for row in chunk for value in row]
+            async with self._write_lock:
+                returned = await self._connection.execute_fetchall(
+                    _insert_transactions_sql(len(chunk)), params
+                )
+            inserted.update(row["signature"] for row in returned)
+
+        # Duplicates within the same batch only count the first occurrence
+        added = []
+        for row in rows:
+            signature = row[1]
+            added.append(signature in inserted)
+            inserted.discard(signature)
+        return added
 
     async def get_transactions(
         self, wallet_address: Optional[str] = None, limit: int = 50
-    ) -> list[dict]:
+    ) -> list[aiosqlite.Row]:
         """Get recent transactions, optionally filtered by wallet."""
         if wallet_address:
             cursor = await self._connection.execute(
@@ -156,15 +408,30 @@ class Database:
             cursor = await self._connection.execute(
                 "SELECT * FROM transactions ORDER BY timestamp DESC LIMIT ?", (limit,)
             )
-        rows = await cursor.fetchall()
-        return [dict(row) for row in rows]
+        return await cursor.fetchall()
 
     async def transaction_exists(self, signature: str) -> bool:
         """Check if a transaction has already been processed."""
-        cursor = await self._connection.execute(
-            "SELECT 1 FROM transactions WHERE signature = ?", (signature,)
+        cursor = await self._connection.execute(_TRANSACTION_EXISTS_SQL, (signature,))
+        row = await cursor.fetchone()
+        return bool(row[0])
+
+    async def save_token_infos(self, tokens: list[tuple]):
+        """
+        Store (address, symbol, name, decimals) rows of token metadata.
+        Each chunk is one multi-row statement, which autocommits atomically.
+        """
+        for start in range(0, len(tokens), _INSERT_CHUNK_SIZE):
+            chunk = tokens[start:start + _INSERT_CHUNK_SIZE]
+            params = [value for row in chunk for value in row]
+            async with self._write_lock:
+                await self._connection.execute(_save_token_infos_sql(len(chunk)), params)
+
+    async def get_token_infos(self) -> list[aiosqlite.Row]:
+        """Get all stored token metadata."""
+        return await self._connection.execute_fetchall(
+            "SELECT address, symbol, name, decimals FROM token_info_cache"
         )
-        return await cursor.fetchone() is not None
 
 
 # Global database instance
@@ -1,7 +1,21 @@
-from typing import Optional
+from collections.abc import Mapping, Sequence
+from typing import Any, Optional
+
+import aiosqlite
+
 from .config import SOLSCAN_TX_URL, SOLSCAN_TOKEN_URL
 from .solana_utils import format_amount, format_usd, shorten_address
 
+# Translation table escaping every Telegram MarkdownV2 special character
+_MD2_TABLE = str.maketrans({
+    c: f"\\{c}"
+    for c in ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+})
+
+# Solscan markdown link prefixes; callers append the id and closing paren
+_TX_LINK_PREFIX = f"[View Transaction]({SOLSCAN_TX_URL}/"
+_TOKEN_LINK_PREFIX = f"[View Token]({SOLSCAN_TOKEN_URL}/"
+
 
 def format_buy_alert(
     wallet_name: str,
@@ -13,14 +27,16 @@ def format_buy_alert(
     signature: str,
 ) -> str:
     """Format a buy alert message."""
+    symbol = _escape_markdown(token_symbol)
+
     lines = [
         "🟢 *BUY ALERT*",
         "",
         f"*Wallet:* {_escape_markdown(wallet_name)}",
         f"*Address:* `{wallet_address}`",
         "",
-        f"*Token:* ${_escape_markdown(token_symbol)}",
-        f"*Amount:* {_escape_markdown(format_amount(amount))} {_escape_markdown(token_symbol)}",
+        f"*Token:* ${symbol}",
+        f"*Amount:* {_escape_markdown(format_amount(amount))} {symbol}",
     ]
 
     if usd_value is not None and usd_value > 0:
@@ -28,8 +44,8 @@ def format_buy_alert(
 
     lines.extend([
         "",
-        f"[View Transaction]({SOLSCAN_TX_URL}/{signature})",
-        f"[View Token]({SOLSCAN_TOKEN_URL}/{token_address})",
+        _TX_LINK_PREFIX + signature + ")",
+        _TOKEN_LINK_PREFIX + token_address + ")",
     ])
 
     return "\n".join(lines)
@@ -45,14 +61,16 @@ def format_sell_alert(
     signature: str,
 ) -> str:
     """Format a sell alert message."""
+    symbol = _escape_markdown(token_symbol)
+
     lines = [
         "🔴 *SELL ALERT*",
         "",
         f"*Wallet:* {_escape_markdown(wallet_name)}",
         f"*Address:* `{wallet_address}`",
         "",
-        f"*Token:* ${_escape_markdown(token_symbol)}",
-        f"*Amount:* {_escape_markdown(format_amount(amount))} {_escape_markdown(token_symbol)}",
+        f"*Token:* ${symbol}",
+        f"*Amount:* {_escape_markdown(format_amount(amount))} {symbol}",
     ]
 
     if usd_value is not None and usd_value > 0:
@@ -60,30 +78,26 @@ def format_sell_alert(
 
     lines.extend([
         "",
-        f"[View Transaction]({SOLSCAN_TX_URL}/{signature})",
-        f"[View Token]({SOLSCAN_TOKEN_URL}/{token_address})",
+        _TX_LINK_PREFIX + signature + ")",
+        _TOKEN_LINK_PREFIX + token_address + ")",
     ])
 
     return "\n".join(lines)
 
 
-def format_wallet_list(wallets: list[dict]) -> str:
+def format_wallet_list(wallets: Sequence[aiosqlite.Row | Mapping[str, Any]]) -> str:
     """Format the list of tracked wallets."""
     if not wallets:
         return "📋 *No wallets being tracked*\n\nUse `/add <address> <name>` to start tracking a wallet."
 
-    lines = ["📋 *Tracked Wallets*", ""]
-
-    for i, wallet in enumerate(wallets, 1):
-        name = _escape_markdown(wallet["name"])
-        address = wallet["address"]
-        lines.append(f"{i}\\. *{name}*")
-        lines.append(f"`{address}`")
-        lines.append("")
-
-    lines.append(f"_Total: {len(wallets)} wallet{'s' if len(wallets) != 1 else ''}_")
+    # Build each entry in one piece and join once, instead of three appends per wallet
+    entries = "".join([
+        f"{i}\\. *{_escape_markdown(wallet['name'])}*\n`{wallet['address']}`\n\n"
+        for i, wallet in enumerate(wallets, 1)
+    ])
+    count = len(wallets)
 
-    return "\n".join(lines)
+    return f"📋 *Tracked Wallets*\n\n{entries}_Total: {count} wallet{'s' if count != 1 else ''}_"
 
 
 def format_wallet_added(name: str, address: str) -> str:
@@ -181,14 +195,11 @@ def format_whosinit(
 
     # Add token link
     lines.append("")
-    lines.append(f"[View Token]({SOLSCAN_TOKEN_URL}/{token_address})")
+    lines.append(_TOKEN_LINK_PREFIX + token_address + ")")
 
     return "\n".join(lines)
 
 
 def _escape_markdown(text: str) -> str:
     """Escape special characters for Telegram MarkdownV2."""
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    for char in special_chars:
-        text = text.replace(char, f'\\{char}')
-    return text
+    return text.translate(_MD2_TABLE)
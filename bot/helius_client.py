@@ -1,16 +1,41 @@
 import httpx
 import asyncio
-from typing import Optional
+import binascii
+import functools
+from typing import Any, Optional
 from dataclasses import dataclass
 import logging
+from collections.abc import Mapping, Sequence
 
-from .config import HELIUS_API_KEY, HELIUS_API_URL, WEBHOOK_URL
+import aiosqlite
+import orjson
+
+from .config import HELIUS_API_KEY, HELIUS_API_URL, HELIUS_RPC_URL, WEBHOOK_URL
+from .solana_utils import calculate_token_amount
 
 logger = logging.getLogger(__name__)
 
 # Rate limiting: max concurrent requests to avoid hitting API limits
 MAX_CONCURRENT_REQUESTS = 10
 
+# Connection-level retries (connect errors/timeouts) done by the transport
+HTTP_RETRIES = 3
+
+# Attempts for an RPC call that keeps getting HTTP 429, with exponential backoff
+RPC_MAX_ATTEMPTS = 4
+RPC_BACKOFF_SECONDS = 0.5
+
+# Max calls per JSON-RPC batch request
+RPC_BATCH_SIZE = 100
+
+# Mint-side holder lookups read at most HOLDER_MAX_PAGES pages of
+# HOLDER_PAGE_LIMIT token accounts before falling back to batched wallet scans
+HOLDER_PAGE_LIMIT = 1000
+HOLDER_MAX_PAGES = 5
+
+# Request bodies are encoded with orjson, so the content type is set by hand
+_JSON_HEADERS = {"content-type": "application/json"}
+
 
 @dataclass
 class TokenBalance:
@@ -24,6 +49,44 @@ class TokenBalance:
 # Store the shared webhook ID
 _shared_webhook_id: Optional[str] = None
 
+# Serializes first-time lookup/creation so concurrent callers can't each create a webhook
+_shared_webhook_lock = asyncio.Lock()
+
+# Mint decimals never change, so they are kept for the life of the process
+_decimals_cache: dict[str, int] = {}
+
+# Only the amount (8 bytes, little-endian u64) of the 165-byte SPL token
+# account is needed
+_TOKEN_AMOUNT_SLICE = {"offset": 64, "length": 8}
+
+
+async def _raise_for_status(response: httpx.Response) -> None:
+    """Response hook: turn every 4xx/5xx into an HTTPStatusError."""
+    if response.is_error:
+        # Read the body so the error log can include it
+        await response.aread()
+        response.raise_for_status()
+
+
+def _helius_call(action: str, default: Any = None):
+    """
+    Decorator for HeliusClient API methods.
+    Logs any HTTP or network error once and returns `default` instead
+    (called first if it is a factory such as `list`).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await func(*args, **kwargs)
+            except httpx.HTTPStatusError as e:
+                logger.error(f"Failed to {action}: {e.response.status_code} - {e.response.text}")
+            except Exception as e:
+                logger.error(f"Error trying to {action}: {e}")
+            return default() if callable(default) else default
+        return wrapper
+    return decorator
+
 
 class HeliusClient:
     """Client for managing Helius webhooks."""
@@ -31,6 +94,53 @@ class HeliusClient:
     def __init__(self, api_key: str = HELIUS_API_KEY):
         self.api_key = api_key
         self.base_url = HELIUS_API_URL
+        self._client: Optional[httpx.AsyncClient] = None
+
+        # Request pieces that never change, built once instead of per call
+        self._webhooks_url = "/webhooks"
+        self._webhook_payload_base = {
+            "webhookURL": f"{WEBHOOK_URL}/helius",
+            "transactionTypes": ["SWAP"],
+            "webhookType": "enhanced",
+        }
+
+    def _get_client(self) -> httpx.AsyncClient:
+        """
+        Get the shared HTTP client, creating it on first use.
+        Reusing one pooled client keeps connections alive between calls
+        instead of paying a TCP + TLS handshake per request.
+        """
+        if self._client is None or self._client.is_closed:
+            # Pool limits and HTTP/2 live on the transport when one is supplied
+            transport = httpx.AsyncHTTPTransport(
+                retries=HTTP_RETRIES,
+                http2=True,
+                limits=httpx.Limits(
+                    max_keepalive_connections=20,
+                    max_connections=50,
+                    keepalive_expiry=60,
+                ),
+            )
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                params={"api-key": self.api_key},
+                timeout=30.0,
+                transport=transport,
+                event_hooks={"response": [_raise_for_status]},
+            )
+        return self._client
+
+    async def aclose(self):
+        """Close the shared HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self) -> "HeliusClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
 
     async def get_or_create_shared_webhook(self) -> Optional[str]:
         """
@@ -42,45 +152,39 @@ class HeliusClient:
         if _shared_webhook_id:
             return _shared_webhook_id
 
-        # Check for existing webhooks
-        webhooks = await self.list_webhooks()
-        for webhook in webhooks:
-            if webhook.get("webhookURL", "").endswith("/helius"):
-                _shared_webhook_id = webhook.get("webhookID")
-                logger.info(f"Using existing webhook: {_shared_webhook_id}")
+        async with _shared_webhook_lock:
+            # Another caller may have resolved it while we waited
+            if _shared_webhook_id:
                 return _shared_webhook_id
 
-        # Create new webhook with empty address list (will be updated when wallets added)
-        webhook_id = await self._create_webhook([])
-        if webhook_id:
-            _shared_webhook_id = webhook_id
-        return webhook_id
-
+            # Check for existing webhooks
+            webhooks = await self.list_webhooks()
+            for webhook in webhooks:
+                if webhook.get("webhookURL", "").endswith("/helius"):
+                    _shared_webhook_id = webhook.get("webhookID")
+                    logger.info(f"Using existing webhook: {_shared_webhook_id}")
+                    return _shared_webhook_id
+
+            # Create new webhook with empty address list (will be updated when wallets added)
+            webhook_id = await self._create_webhook([])
+            if webhook_id:
+                _shared_webhook_id = webhook_id
+            return webhook_id
+
+    @_helius_call("create webhook", default=None)
     async def _create_webhook(self, wallet_addresses: list[str]) -> Optional[str]:
         """Create a new Helius webhook."""
-        url = f"{self.base_url}/webhooks?api-key={self.api_key}"
-
         payload = {
-            "webhookURL": f"{WEBHOOK_URL}/helius",
-            "transactionTypes": ["SWAP"],
+            **self._webhook_payload_base,
             "accountAddresses": wallet_addresses if wallet_addresses else ["11111111111111111111111111111111"],  # Placeholder if empty
-            "webhookType": "enhanced",
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(url, json=payload, timeout=30.0)
-                response.raise_for_status()
-                data = response.json()
-                webhook_id = data.get("webhookID")
-                logger.info(f"Created webhook {webhook_id}")
-                return webhook_id
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Failed to create webhook: {e.response.status_code} - {e.response.text}")
-                return None
-            except Exception as e:
-                logger.error(f"Error creating webhook: {e}")
-                return None
+        response = await self._get_client().post(
+            self._webhooks_url, content=orjson.dumps(payload), headers=_JSON_HEADERS
+        )
+        webhook_id = orjson.loads(response.content).get("webhookID")
+        logger.info(f"Created webhook {webhook_id}")
+        return webhook_id
 
     async def add_wallet_to_webhook(self, wallet_address: str, all_addresses: list[str]) -> bool:
         """
@@ -110,166 +214,235 @@ class HeliusClient:
 
         return await self.update_webhook(_shared_webhook_id, remaining_addresses)
 
+    @_helius_call("delete webhook", default=False)
     async def delete_webhook(self, webhook_id: str) -> bool:
         """Delete a Helius webhook by ID."""
-        url = f"{self.base_url}/webhooks/{webhook_id}?api-key={self.api_key}"
-
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.delete(url, timeout=30.0)
-                response.raise_for_status()
-                logger.info(f"Deleted webhook {webhook_id}")
-                return True
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Failed to delete webhook: {e.response.status_code} - {e.response.text}")
-                return False
-            except Exception as e:
-                logger.error(f"Error deleting webhook: {e}")
-                return False
+        await self._get_client().delete(f"{self._webhooks_url}/{webhook_id}")
+        logger.info(f"Deleted webhook {webhook_id}")
+        return True
 
+    @_helius_call("list webhooks", default=list)
     async def list_webhooks(self) -> list[dict]:
         """List all webhooks for this API key."""
-        url = f"{self.base_url}/webhooks?api-key={self.api_key}"
-
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.get(url, timeout=30.0)
-                response.raise_for_status()
-                webhooks = response.json()
-                return webhooks if isinstance(webhooks, list) else []
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Failed to list webhooks: {e.response.status_code} - {e.response.text}")
-                return []
-            except Exception as e:
-                logger.error(f"Error listing webhooks: {e}")
-                return []
+        response = await self._get_client().get(self._webhooks_url)
+        webhooks = orjson.loads(response.content)
+        return webhooks if isinstance(webhooks, list) else []
 
+    @_helius_call("update webhook", default=False)
     async def update_webhook(self, webhook_id: str, wallet_addresses: list[str]) -> bool:
         """Update a webhook with new wallet addresses."""
-        url = f"{self.base_url}/webhooks/{webhook_id}?api-key={self.api_key}"
+        payload = {**self._webhook_payload_base, "accountAddresses": wallet_addresses}
+
+        await self._get_client().put(
+            f"{self._webhooks_url}/{webhook_id}", content=orjson.dumps(payload), headers=_JSON_HEADERS
+        )
+        logger.info(f"Updated webhook {webhook_id} with {len(wallet_addresses)} addresses")
+        return True
+
+    async def _rpc(self, payload: dict | list[dict]) -> Any:
+        """POST a JSON-RPC request, backing off exponentially on HTTP 429."""
+        delay = RPC_BACKOFF_SECONDS
+        for attempt in range(RPC_MAX_ATTEMPTS):
+            try:
+                response = await self._get_client().post(
+                    HELIUS_RPC_URL, content=orjson.dumps(payload), headers=_JSON_HEADERS
+                )
+                return orjson.loads(response.content)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code != 429 or attempt == RPC_MAX_ATTEMPTS - 1:
+                    raise
+                retry_after = e.response.headers.get("Retry-After", "")
+                wait = float(retry_after) if retry_after.isdigit() else delay
+                logger.warning(f"Helius RPC rate limited, retrying in {wait}s")
+                await asyncio.sleep(wait)
+                delay *= 2
+
+    @_helius_call("get token decimals")
+    async def get_token_decimals(self, token_mint: str) -> Optional[int]:
+        """Get the decimals of a token mint via getTokenSupply. Returns None on failure."""
+        if token_mint in _decimals_cache:
+            return _decimals_cache[token_mint]
 
         payload = {
-            "webhookURL": f"{WEBHOOK_URL}/helius",
-            "transactionTypes": ["SWAP"],
-            "accountAddresses": wallet_addresses,
-            "webhookType": "enhanced",
+            "jsonrpc": "2.0",
+            "id": 1,
+            "method": "getTokenSupply",
+            "params": [token_mint],
         }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.put(url, json=payload, timeout=30.0)
-                response.raise_for_status()
-                logger.info(f"Updated webhook {webhook_id} with {len(wallet_addresses)} addresses")
-                return True
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Failed to update webhook: {e.response.status_code} - {e.response.text}")
-                return False
-            except Exception as e:
-                logger.error(f"Error updating webhook: {e}")
-                return False
+        data = await self._rpc(payload)
+
+        if "error" in data:
+            logger.error(f"RPC error for {token_mint}: {data['error']}")
+            return None
 
-    async def get_wallet_balances(self, wallet_address: str) -> list[dict]:
+        decimals = data["result"]["value"]["decimals"]
+        _decimals_cache[token_mint] = decimals
+        return decimals
+
+    @_helius_call("get token holders from DAS")
+    async def get_token_holders_fast(
+        self,
+        token_mint: str,
+        wallets: Sequence[aiosqlite.Row | Mapping[str, Any]],  # Wallets with address and name
+    ) -> Optional[list[TokenBalance]]:
         """
-        Get all token balances for a wallet using Helius RPC.
-        Returns list of {mint, amount, decimals} for each token held.
+        Check which wallets hold a token by listing the mint's token accounts
+        (Helius DAS getTokenAccounts) and matching their owners, which takes
+        one request per page of holders instead of one per wallet.
+        Returns None if the mint has more holders than HOLDER_MAX_PAGES
+        pages cover, or on failure.
         """
-        # Use Helius RPC endpoint for more reliable results
-        rpc_url = f"https://mainnet.helius-rpc.com/?api-key={self.api_key}"
+        tracked = {w["address"]: w for w in wallets}
+        amounts: dict[str, int] = {}
 
-        payload = {
-            "jsonrpc": "2.0",
-            "id": 1,
-            "method": "getTokenAccountsByOwner",
-            "params": [
-                wallet_address,
-                {"programId": "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"},
-                {"encoding": "jsonParsed"}
-            ]
-        }
+        for page in range(1, HOLDER_MAX_PAGES + 1):
+            payload = {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "getTokenAccounts",
+                "params": {"mint": token_mint, "page": page, "limit": HOLDER_PAGE_LIMIT},
+            }
 
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(rpc_url, json=payload, timeout=30.0)
-                response.raise_for_status()
-                data = response.json()
-
-                if "error" in data:
-                    logger.error(f"RPC error for {wallet_address}: {data['error']}")
-                    return []
-
-                balances = []
-                accounts = data.get("result", {}).get("value", [])
-                for account in accounts:
-                    parsed = account.get("account", {}).get("data", {}).get("parsed", {})
-                    info = parsed.get("info", {})
-                    token_amount = info.get("tokenAmount", {})
-
-                    mint = info.get("mint")
-                    amount = int(token_amount.get("amount", "0"))
-                    decimals = token_amount.get("decimals", 6)
-
-                    if mint and amount > 0:
-                        balances.append({
-                            "mint": mint,
-                            "amount": amount,
-                            "decimals": decimals,
-                        })
-                return balances
+            data = await self._rpc(payload)
 
-            except httpx.HTTPStatusError as e:
-                logger.error(f"Failed to get balances for {wallet_address}: {e.response.status_code}")
-                return []
-            except Exception as e:
-                logger.error(f"Error getting balances for {wallet_address}: {e}")
-                return []
+            if "error" in data:
+                logger.error(f"RPC error for {token_mint}: {data['error']}")
+                return None
+
+            accounts = data["result"]["token_accounts"]
+            for account in accounts:
+                owner = account["owner"]
+                if owner in tracked and account["amount"] > 0:
+                    # An owner can hold the same mint in several token accounts
+                    amounts[owner] = amounts.get(owner, 0) + account["amount"]
+            if len(accounts) < HOLDER_PAGE_LIMIT:
+                break
+        else:
+            logger.info(f"Token {token_mint} has too many holders to list, checking wallets instead")
+            return None
+
+        decimals = await self.get_token_decimals(token_mint)
+        if decimals is None:
+            return None
+
+        holders = [
+            TokenBalance(
+                wallet_address=owner,
+                wallet_name=tracked[owner]["name"],
+                mint=token_mint,
+                amount=calculate_token_amount(amount, decimals),
+                decimals=decimals,
+            )
+            for owner, amount in amounts.items()
+        ]
+        holders.sort(key=lambda x: x.amount, reverse=True)
+        return holders
+
+    @_helius_call("get token holder balances", default=dict)
+    async def _get_holder_amounts(self, token_mint: str, owners: list[str]) -> dict[str, int]:
+        """
+        Get each owner's raw balance of one token with a single JSON-RPC batch
+        of getTokenAccountsByOwner calls filtered by mint.
+        Returns {owner: amount} for owners with a non-zero balance.
+        """
+        payload = [
+            {
+                "jsonrpc": "2.0",
+                "id": i,
+                "method": "getTokenAccountsByOwner",
+                "params": [
+                    owner,
+                    {"mint": token_mint},
+                    {"encoding": "base64", "dataSlice": _TOKEN_AMOUNT_SLICE},
+                ],
+            }
+            for i, owner in enumerate(owners)
+        ]
+
+        responses = await self._rpc(payload)
+        if isinstance(responses, dict):
+            # The whole batch was rejected
+            logger.error(f"RPC error for batch of {len(owners)} wallets: {responses.get('error')}")
+            return {}
+
+        amounts = {}
+        for response in responses:
+            owner = owners[response["id"]]
+            if "error" in response:
+                logger.error(f"RPC error for {owner}: {response['error']}")
+                continue
+            # An owner can hold the same mint in several token accounts
+            amount = sum(
+                int.from_bytes(binascii.a2b_base64(account["account"]["data"][0]), "little")
+                for account in response["result"]["value"]
+            )
+            if amount > 0:
+                amounts[owner] = amount
+        return amounts
 
     async def get_token_holders(
         self,
         token_mint: str,
-        wallets: list[dict],  # List of {address, name}
+        wallets: Sequence[aiosqlite.Row | Mapping[str, Any]],  # Wallets with address and name
     ) -> list[TokenBalance]:
         """
         Check which wallets from the list hold a specific token.
-        Uses parallel requests with rate limiting.
+        Wallets are checked in JSON-RPC batches, using a fixed pool of
+        concurrent workers for rate limiting. With more wallets than one
+        batch holds, a mint-side lookup is tried first.
 
         Args:
             token_mint: The token mint address to check
-            wallets: List of wallet dicts with 'address' and 'name' keys
+            wallets: Wallet rows or dicts with 'address' and 'name' keys
 
         Returns:
             List of TokenBalance for wallets that hold the token
         """
-        holders = []
-        semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
-
-        async def check_wallet(wallet: dict) -> Optional[TokenBalance]:
-            async with semaphore:
-                balances = await self.get_wallet_balances(wallet["address"])
-                logger.info(f"Wallet {wallet['name']} has {len(balances)} token accounts")
-                for bal in balances:
-                    if bal["mint"] == token_mint:
-                        # Convert raw amount to human-readable
-                        decimals = bal["decimals"]
-                        human_amount = bal["amount"] / (10 ** decimals)
-                        logger.info(f"Found token in {wallet['name']}: {human_amount} (raw={bal['amount']})")
-                        return TokenBalance(
-                            wallet_address=wallet["address"],
-                            wallet_name=wallet["name"],
-                            mint=token_mint,
-                            amount=human_amount,
-                            decimals=decimals,
-                        )
-                return None
-
-        # Run all checks in parallel with rate limiting
-        tasks = [check_wallet(w) for w in wallets]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-
-        for result in results:
-            if isinstance(result, TokenBalance):
-                holders.append(result)
-            elif isinstance(result, Exception):
-                logger.error(f"Error checking wallet: {result}")
+        if not wallets:
+            return []
+
+        # The batched scan takes a single request for up to RPC_BATCH_SIZE
+        # wallets, while the mint-side lookup takes one sequential request per
+        # page and gives up on popular tokens after HOLDER_MAX_PAGES of them
+        if len(wallets) > RPC_BATCH_SIZE:
+            holders = await self.get_token_holders_fast(token_mint, wallets)
+            if holders is not None:
+                return holders
+
+        # Balances come back raw, so the mint's decimals are looked up once per scan
+        decimals = await self.get_token_decimals(token_mint)
+        if decimals is None:
+            return []
+
+        # Owners are checked RPC_BATCH_SIZE at a time in JSON-RPC batch requests;
+        # a fixed pool of workers pulls batches from a shared iterator, so at
+        # most MAX_CONCURRENT_REQUESTS requests are in flight however many wallets
+        addresses = [w["address"] for w in wallets]
+        batch_list = [
+            addresses[start:start + RPC_BATCH_SIZE]
+            for start in range(0, len(addresses), RPC_BATCH_SIZE)
+        ]
+        batches = iter(batch_list)
+        amounts: dict[str, int] = {}
+
+        async def worker():
+            for batch in batches:
+                amounts.update(await self._get_holder_amounts(token_mint, batch))
+
+        await asyncio.gather(*(worker() for _ in range(min(MAX_CONCURRENT_REQUESTS, len(batch_list)))))
+
+        names = {w["address"]: w["name"] for w in wallets}
+        holders = [
+            TokenBalance(
+                wallet_address=owner,
+                wallet_name=names[owner],
+                mint=token_mint,
+                amount=calculate_token_amount(amount, decimals),
+                decimals=decimals,
+            )
+            for owner, amount in amounts.items()
+        ]
 
         # Sort by amount descending
         holders.sort(key=lambda x: x.amount, reverse=True)
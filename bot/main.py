@@ -6,9 +6,15 @@ from contextlib import asynccontextmanager
 
 from .config import validate_config, WEBHOOK_PORT
 from .database import db
-from .telegram_bot import create_bot_application
+from .telegram_bot import create_bot_application, run_alert_worker
 from .webhook_server import app as fastapi_app
 from .helius_client import helius_client
+from .solana_utils import close_http, warm_token_cache
+
+try:
+    import uvloop
+except ImportError:  # Not available on Windows
+    uvloop = None
 
 # Configure logging
 logging.basicConfig(
@@ -75,23 +81,27 @@ async def main():
     await db.connect()
     logger.info("Database initialized")
 
-    # Sync webhook with all tracked wallets
-    wallets = await db.get_wallets()
-    if wallets:
-        addresses = [w["address"] for w in wallets]
-        await helius_client.add_wallet_to_webhook(addresses[0], addresses)
-        logger.info(f"Synced webhook with {len(addresses)} wallet addresses")
-
     try:
-        # Run both services concurrently
+        # Warm the token metadata cache from earlier runs
+        token_count = await warm_token_cache()
+        logger.info(f"Loaded {token_count} cached tokens")
+
+        # Sync webhook with all tracked wallets
+        addresses = await db.get_all_addresses()
+        if addresses:
+            await helius_client.add_wallet_to_webhook(addresses[0], addresses)
+            logger.info(f"Synced webhook with {len(addresses)} wallet addresses")
+
+        # Run all services concurrently
         bot_task = asyncio.create_task(run_telegram_bot())
         server_task = asyncio.create_task(run_webhook_server())
+        alert_task = asyncio.create_task(run_alert_worker())
 
         logger.info("All services started")
 
-        # Wait for both tasks (or until one fails)
+        # Wait for the tasks (or until one fails)
         done, pending = await asyncio.wait(
-            [bot_task, server_task],
+            [bot_task, server_task, alert_task],
             return_when=asyncio.FIRST_COMPLETED,
         )
 
@@ -107,14 +117,19 @@ async def main():
     except KeyboardInterrupt:
         logger.info("Received shutdown signal")
     finally:
+        await helius_client.aclose()
+        await close_http()
         await db.close()
         logger.info("Shutdown complete")
 
 
 def run():
     """Entry point for running the application."""
+    # uvloop is a faster drop-in event loop where it is installed
+    loop_factory = uvloop.new_event_loop if uvloop is not None else None
     try:
-        asyncio.run(main())
+        with asyncio.Runner(loop_factory=loop_factory) as runner:
+            runner.run(main())
     except KeyboardInterrupt:
         pass
 
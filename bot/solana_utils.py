@@ -1,9 +1,14 @@
+import asyncio
 import httpx
-import re
 from typing import Optional
 from dataclasses import dataclass
 import logging
 
+import orjson
+from cachetools import LRUCache, TTLCache
+
+from .database import db
+
 # DexScreener API is used for token info and pricing
 
 logger = logging.getLogger(__name__)
@@ -18,8 +23,60 @@ STABLECOINS = {
     "USDSwr9ApdHk5bvJKMjzff41FfuX8bSxdKcR81vTwcA": "USDS",
 }
 
-# Common token cache to avoid repeated API calls
-_token_cache: dict[str, "TokenInfo"] = {}
+# Tokens a swap is priced in; the other side of the swap is the traded token
+QUOTE_MINTS = frozenset({SOL_MINT, *STABLECOINS})
+
+# Base58 alphabet (no 0, O, I, l), as bytes for bytes.translate
+_BASE58_ALPHABET = b"123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+
+# Format specs for format_amount, built once instead of per call
+_AMOUNT_SPECS = tuple(f",.{d}f" for d in range(10))
+
+# Powers of ten for SPL token decimals (0-18)
+_POW10F = tuple(float(10 ** i) for i in range(19))
+
+# Token metadata rarely changes, prices move constantly
+_token_cache: TTLCache = TTLCache(maxsize=10_000, ttl=3600)
+_price_cache: TTLCache = TTLCache(maxsize=4096, ttl=30)
+
+# Mints DexScreener had no price for, so repeat swaps of an unlisted token
+# don't refetch it every time; short-lived so new listings show up quickly
+_no_price: TTLCache = TTLCache(maxsize=4096, ttl=60)
+
+# Last good value per mint, served if a refresh fails
+_stale_tokens: LRUCache = LRUCache(maxsize=10_000)
+_stale_prices: LRUCache = LRUCache(maxsize=4096)
+
+# DexScreener accepts up to 30 comma-separated token addresses per request
+DEXSCREENER_BATCH_SIZE = 30
+
+# Fetches in progress, so concurrent callers for the same mint share one request
+_inflight: dict[str, asyncio.Future] = {}
+
+# Shared HTTP client for token APIs, created on first use
+_http: Optional[httpx.AsyncClient] = None
+
+
+def _get_client() -> httpx.AsyncClient:
+    """Get the shared pooled HTTP client for token lookups."""
+    global _http
+
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=10, max_connections=50),
+            http2=True,
+        )
+    return _http
+
+
+async def close_http():
+    """Close the shared HTTP client."""
+    global _http
+
+    if _http is not None:
+        await _http.aclose()
+        _http = None
 
 
 @dataclass
@@ -31,10 +88,29 @@ class TokenInfo:
     logo_uri: Optional[str] = None
 
 
+async def warm_token_cache() -> int:
+    """
+    Load token metadata saved by earlier runs into the in-memory cache,
+    so mints seen before don't need a network lookup after a restart.
+    Returns the number of tokens loaded.
+    """
+    rows = await db.get_token_infos()
+    for row in rows:
+        token = TokenInfo(
+            address=row["address"],
+            symbol=row["symbol"],
+            name=row["name"],
+            decimals=row["decimals"],
+        )
+        _token_cache[token.address] = _stale_tokens[token.address] = token
+    return len(rows)
+
+
 async def get_token_info(mint_address: str) -> Optional[TokenInfo]:
     """
     Fetch token metadata from DexScreener API.
-    Results are cached in memory.
+    Results are cached in memory for an hour; concurrent info and price
+    lookups of the same mint share one request.
     """
     # Check cache first
     if mint_address in _token_cache:
@@ -51,73 +127,161 @@ async def get_token_info(mint_address: str) -> Optional[TokenInfo]:
         _token_cache[mint_address] = token
         return token
 
-    url = f"https://api.dexscreener.com/latest/dex/tokens/{mint_address}"
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, timeout=30.0)
-            response.raise_for_status()
-            data = response.json()
-
-            pairs = data.get("pairs", [])
-            # Find Solana pair
-            solana_pairs = [p for p in pairs if p.get("chainId") == "solana"]
-            if solana_pairs:
-                base_token = solana_pairs[0].get("baseToken", {})
-                if base_token.get("address") == mint_address:
-                    token = TokenInfo(
-                        address=mint_address,
-                        symbol=base_token.get("symbol", "UNKNOWN"),
-                        name=base_token.get("name", "Unknown Token"),
-                        decimals=6,  # Default for most SPL tokens
-                    )
-                    _token_cache[mint_address] = token
-                    return token
-
-            # If not found, return a basic token info
-            return TokenInfo(
-                address=mint_address,
-                symbol="UNKNOWN",
-                name="Unknown Token",
-                decimals=6,
-            )
+    # Stablecoin metadata is known; their price is never fetched
+    if mint_address in STABLECOINS:
+        symbol = STABLECOINS[mint_address]
+        token = TokenInfo(
+            address=mint_address,
+            symbol=symbol,
+            name=symbol,
+            decimals=6,
+        )
+        _token_cache[mint_address] = token
+        return token
 
-        except Exception as e:
-            logger.error(f"Error fetching token info: {e}")
-            return None
+    # Metadata comes with the price lookup, so fetch through it; a concurrent
+    # get_token_price for the same mint then shares the one request
+    await get_token_prices([mint_address])
+    token = _token_cache.get(mint_address) or _stale_tokens.get(mint_address)
+
+    if token is None:
+        # If not found, return a basic token info (not cached, so it is
+        # picked up once DexScreener lists the token)
+        return TokenInfo(
+            address=mint_address,
+            symbol="UNKNOWN",
+            name="Unknown Token",
+            decimals=6,
+        )
+    return token
 
 
 async def get_token_price(mint_address: str) -> Optional[float]:
     """
     Get token price in USD from DexScreener API.
-    Stablecoins are hardcoded to $1.00.
+    Stablecoins are hardcoded to $1.00. Prices are cached for 30 seconds;
+    if a refresh fails the last known price is returned.
     """
-    # Stablecoins are always $1.00
-    if mint_address in STABLECOINS:
-        return 1.0
+    prices = await get_token_prices([mint_address])
+    return prices.get(mint_address)
 
-    url = f"https://api.dexscreener.com/latest/dex/tokens/{mint_address}"
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.get(url, timeout=30.0)
-            response.raise_for_status()
-            data = response.json()
-
-            pairs = data.get("pairs", [])
-            # Find Solana pair with highest liquidity
-            solana_pairs = [p for p in pairs if p.get("chainId") == "solana"]
-            if solana_pairs:
-                # Sort by liquidity and get the best one
-                solana_pairs.sort(key=lambda x: x.get("liquidity", {}).get("usd", 0), reverse=True)
-                price_str = solana_pairs[0].get("priceUsd")
-                if price_str:
-                    return float(price_str)
-            return None
+async def get_token_prices(mint_addresses: list[str]) -> dict[str, float]:
+    """
+    Get USD prices for several tokens at once.
+    Only cache misses are fetched, batched into DexScreener requests of up
+    to DEXSCREENER_BATCH_SIZE mints. Mints without a price are left out,
+    and not asked for again for a minute.
+    """
+    prices: dict[str, float] = {}
+    pending: dict[str, asyncio.Future] = {}
+    missing: list[str] = []
+
+    for mint in dict.fromkeys(mint_addresses):
+        if mint in STABLECOINS:
+            # Stablecoins are always $1.00
+            prices[mint] = 1.0
+        elif mint in _price_cache:
+            prices[mint] = _price_cache[mint]
+        elif mint in _no_price:
+            continue
+        elif mint in _inflight:
+            # Already being fetched by another caller; share its request
+            pending[mint] = _inflight[mint]
+        else:
+            missing.append(mint)
+
+    for start in range(0, len(missing), DEXSCREENER_BATCH_SIZE):
+        batch = missing[start:start + DEXSCREENER_BATCH_SIZE]
+        task = asyncio.ensure_future(_fetch_token_prices(batch))
+        for mint in batch:
+            _inflight[mint] = task
+            pending[mint] = task
+        task.add_done_callback(
+            lambda _, batch=batch: [_inflight.pop(mint, None) for mint in batch]
+        )
+
+    if not pending:
+        return prices
+
+    # Shield so a cancelled caller doesn't cancel fetches other callers share
+    tasks = list(set(pending.values()))
+    outcomes = await asyncio.gather(*(asyncio.shield(t) for t in tasks), return_exceptions=True)
+    results = dict(zip(tasks, outcomes))
+    for outcome in outcomes:
+        if isinstance(outcome, Exception):
+            logger.error(f"Error fetching token price: {outcome}")
+
+    for mint, task in pending.items():
+        result = results[task]
+        if isinstance(result, Exception):
+            price = _stale_prices.get(mint)
+        else:
+            price = result.get(mint)
+            if price is not None:
+                _price_cache[mint] = price
+                _stale_prices[mint] = price
+            else:
+                _no_price[mint] = None
+        if price is not None:
+            prices[mint] = price
+
+    return prices
+
+
+async def _fetch_token_prices(mint_addresses: list[str]) -> dict[str, float]:
+    """
+    Fetch USD prices for up to DEXSCREENER_BATCH_SIZE mints in one request.
+    Each mint is priced from its most liquid Solana pair. Token metadata in
+    the response is cached as well, so a later get_token_info is a dict hit.
+    """
+    url = f"https://api.dexscreener.com/latest/dex/tokens/{','.join(mint_addresses)}"
+
+    response = await _get_client().get(url)
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+
+    # Keep only the most liquid Solana pair per token, in a single pass
+    best_pairs: dict[str, dict] = {}
+    for pair in data.get("pairs") or []:
+        if pair.get("chainId") != "solana":
+            continue
+        mint = pair.get("baseToken", {}).get("address")
+        if mint in mint_addresses:
+            best = best_pairs.get(mint)
+            if best is None or _pair_liquidity(pair) > _pair_liquidity(best):
+                best_pairs[mint] = pair
+
+    prices = {}
+    new_tokens = []
+    for mint, pair in best_pairs.items():
+        if mint not in _token_cache:
+            base_token = pair["baseToken"]
+            token = TokenInfo(
+                address=mint,
+                symbol=base_token.get("symbol", "UNKNOWN"),
+                name=base_token.get("name", "Unknown Token"),
+                decimals=6,  # Default for most SPL tokens
+            )
+            _token_cache[mint] = _stale_tokens[mint] = token
+            new_tokens.append((token.address, token.symbol, token.name, token.decimals))
 
+        price_str = pair.get("priceUsd")
+        if price_str:
+            prices[mint] = float(price_str)
+
+    if new_tokens:
+        # Persist metadata so the next start can warm the cache from disk
+        try:
+            await db.save_token_infos(new_tokens)
         except Exception as e:
-            logger.error(f"Error fetching token price: {e}")
-            return None
+            logger.error(f"Error saving token info: {e}")
+    return prices
+
+
+def _pair_liquidity(pair: dict) -> float:
+    """USD liquidity of a DexScreener pair (0 if unknown)."""
+    return pair.get("liquidity", {}).get("usd", 0)
 
 
 def format_amount(amount: float, decimals: int = 2) -> str:
@@ -125,14 +289,13 @@ def format_amount(amount: float, decimals: int = 2) -> str:
     Format a number with commas and specified decimal places.
     Handles large numbers nicely.
     """
-    if amount >= 1_000_000_000:
-        return f"{amount / 1_000_000_000:,.{decimals}f}B"
-    elif amount >= 1_000_000:
-        return f"{amount / 1_000_000:,.{decimals}f}M"
-    elif amount >= 1_000:
-        return f"{amount:,.{decimals}f}"
+    spec = _AMOUNT_SPECS[decimals] if 0 <= decimals < len(_AMOUNT_SPECS) else f",.{decimals}f"
+    if amount >= 1_000_000:
+        if amount >= 1_000_000_000:
+            return format(amount / 1_000_000_000, spec) + "B"
+        return format(amount / 1_000_000, spec) + "M"
     elif amount >= 1:
-        return f"{amount:,.{decimals}f}"
+        return format(amount, spec)
     else:
         # For very small numbers, show more decimals
         return f"{amount:,.6f}"
@@ -142,8 +305,6 @@ def format_usd(amount: float) -> str:
     """Format a USD amount."""
     if amount >= 1_000_000:
         return f"${amount / 1_000_000:,.2f}M"
-    elif amount >= 1_000:
-        return f"${amount:,.2f}"
     elif amount >= 0.01:
         return f"${amount:,.2f}"
     else:
@@ -162,9 +323,8 @@ def is_valid_solana_address(address: str) -> bool:
     if len(address) < 32 or len(address) > 44:
         return False
 
-    # Check for valid base58 characters (no 0, O, I, l)
-    base58_pattern = re.compile(r"^[1-9A-HJ-NP-Za-km-z]+$")
-    return bool(base58_pattern.match(address))
+    # Valid base58 iff deleting every alphabet byte leaves nothing
+    return address.isascii() and not address.encode().translate(None, _BASE58_ALPHABET)
 
 
 def shorten_address(address: str, chars: int = 4) -> str:
@@ -176,5 +336,7 @@ def shorten_address(address: str, chars: int = 4) -> str:
 
 def calculate_token_amount(raw_amount: int, decimals: int) -> float:
     """Convert raw token amount to human-readable amount."""
+    if decimals < 19:
+        return raw_amount / _POW10F[decimals]
     return raw_amount / (10 ** decimals)
 
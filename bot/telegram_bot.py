@@ -1,5 +1,9 @@
+import asyncio
+import functools
 import logging
-from telegram import Update
+import time
+from typing import Optional
+from telegram import Bot, Update
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -23,32 +27,95 @@ from .formatters import (
 
 logger = logging.getLogger(__name__)
 
+_MD2 = ParseMode.MARKDOWN_V2
+
+
+class TokenBucket:
+    """
+    Async rate limiter allowing `rate` acquisitions per second on average,
+    with bursts of up to `burst`.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                # Sleep until one token has refilled, then spend it
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._tokens = 0.0
+                self._updated = time.monotonic()
+            else:
+                self._tokens -= 1
+
+
+# Telegram allows about 30 messages per second per bot and 1 per second per chat
+_global_bucket = TokenBucket(rate=30, burst=30)
+_chat_buckets: dict[str, TokenBucket] = {}
+
+# The running application, whose bot also sends alerts
+_app: Optional[Application] = None
+
+# Bot for alerts when no application exists, created on first use
+_alert_bot: Optional[Bot] = None
+
+# Alerts waiting to be delivered by run_alert_worker()
+_alert_queue: asyncio.Queue[str] = asyncio.Queue()
+
+
+# Updates are handled concurrently; /add and /remove each rewrite the webhook's
+# full address list, so they must not interleave
+_wallet_update_lock = asyncio.Lock()
+
+
+def _one_at_a_time(handler):
+    """Decorator: run a wallet-changing command handler under _wallet_update_lock."""
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        async with _wallet_update_lock:
+            await handler(update, context)
+    return wrapper
+
+
+async def _reply_md2(update: Update, text: str, **kwargs):
+    """Reply to the command's message with MarkdownV2 text."""
+    return await update.message.reply_text(text, parse_mode=_MD2, **kwargs)
+
+
+async def _reply_err(update: Update, text: str):
+    """Reply to the command's message with a formatted error."""
+    return await _reply_md2(update, format_error(text))
+
 
 async def chatid_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /chatid command - shows the current chat's ID."""
     chat_id = update.effective_chat.id
     chat_type = update.effective_chat.type
-    await update.message.reply_text(
+    await _reply_md2(
+        update,
         f"Chat ID: `{chat_id}`\nChat type: {chat_type}\n\nUse this ID as your TELEGRAM\\_CHAT\\_ID in \\.env",
-        parse_mode=ParseMode.MARKDOWN_V2,
     )
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /start command."""
-    await update.message.reply_text(
-        format_welcome(),
-        parse_mode=ParseMode.MARKDOWN_V2,
-    )
+    await _reply_md2(update, format_welcome())
 
 
+@_one_at_a_time
 async def add_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /add <address> <name> command."""
     if not context.args or len(context.args) < 2:
-        await update.message.reply_text(
-            format_error("Usage: /add <address> <name>"),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Usage: /add <address> <name>")
         return
 
     address = context.args[0]
@@ -56,56 +123,39 @@ async def add_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Non
 
     # Validate address
     if not is_valid_solana_address(address):
-        await update.message.reply_text(
-            format_error("Invalid Solana address format."),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Invalid Solana address format.")
         return
 
     # Check if wallet already exists
     existing = await db.get_wallet(address)
     if existing:
-        await update.message.reply_text(
-            format_error(f"Wallet is already being tracked as '{existing['name']}'."),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, f"Wallet is already being tracked as '{existing['name']}'.")
         return
 
     # Get all current wallet addresses and add the new one
-    wallets = await db.get_wallets()
-    all_addresses = [w["address"] for w in wallets] + [address]
+    all_addresses = await db.get_all_addresses()
+    all_addresses.append(address)
 
     # Update the shared webhook with all addresses
     success = await helius_client.add_wallet_to_webhook(address, all_addresses)
     if not success:
-        await update.message.reply_text(
-            format_error("Failed to setup monitoring. Please try again later."),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Failed to setup monitoring. Please try again later.")
         return
 
     # Add to database (no individual webhook ID needed anymore)
     success = await db.add_wallet(address, name, None)
     if success:
-        await update.message.reply_text(
-            format_wallet_added(name, address),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_md2(update, format_wallet_added(name, address))
         logger.info(f"Added wallet: {name} ({address})")
     else:
-        await update.message.reply_text(
-            format_error("Failed to add wallet. Please try again."),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Failed to add wallet. Please try again.")
 
 
+@_one_at_a_time
 async def remove_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /remove <address> command."""
     if not context.args:
-        await update.message.reply_text(
-            format_error("Usage: /remove <address>"),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Usage: /remove <address>")
         return
 
     address = context.args[0]
@@ -113,43 +163,30 @@ async def remove_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # Get wallet info before removing
     wallet = await db.get_wallet(address)
     if not wallet:
-        await update.message.reply_text(
-            format_error("Wallet not found in tracked list."),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Wallet not found in tracked list.")
         return
 
     # Remove from database first
     await db.remove_wallet(address)
 
     # Get remaining addresses and update webhook
-    wallets = await db.get_wallets()
-    remaining_addresses = [w["address"] for w in wallets]
+    remaining_addresses = await db.get_all_addresses()
     await helius_client.remove_wallet_from_webhook(remaining_addresses)
 
-    await update.message.reply_text(
-        format_wallet_removed(wallet["name"], address),
-        parse_mode=ParseMode.MARKDOWN_V2,
-    )
+    await _reply_md2(update, format_wallet_removed(wallet["name"], address))
     logger.info(f"Removed wallet: {wallet['name']} ({address})")
 
 
 async def list_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /list command."""
     wallets = await db.get_wallets()
-    await update.message.reply_text(
-        format_wallet_list(wallets),
-        parse_mode=ParseMode.MARKDOWN_V2,
-    )
+    await _reply_md2(update, format_wallet_list(wallets))
 
 
 async def rename_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /rename <address> <new_name> command."""
     if not context.args or len(context.args) < 2:
-        await update.message.reply_text(
-            format_error("Usage: /rename <address> <new_name>"),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Usage: /rename <address> <new_name>")
         return
 
     address = context.args[0]
@@ -158,10 +195,7 @@ async def rename_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # Get current wallet info
     wallet = await db.get_wallet(address)
     if not wallet:
-        await update.message.reply_text(
-            format_error("Wallet not found in tracked list."),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Wallet not found in tracked list.")
         return
 
     old_name = wallet["name"]
@@ -169,63 +203,46 @@ async def rename_command(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     # Update name
     success = await db.rename_wallet(address, new_name)
     if success:
-        await update.message.reply_text(
-            format_wallet_renamed(old_name, new_name, address),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_md2(update, format_wallet_renamed(old_name, new_name, address))
         logger.info(f"Renamed wallet: {old_name} -> {new_name} ({address})")
     else:
-        await update.message.reply_text(
-            format_error("Failed to rename wallet."),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Failed to rename wallet.")
 
 
 async def whosinit_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handle the /whosinit <token_address> command."""
     if not context.args:
-        await update.message.reply_text(
-            format_error("Usage: /whosinit <token_address>"),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Usage: /whosinit <token_address>")
         return
 
     token_address = context.args[0]
 
     # Validate token address format
     if not is_valid_solana_address(token_address):
-        await update.message.reply_text(
-            format_error("Invalid token address format."),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "Invalid token address format.")
         return
 
     # Get all tracked wallets
     wallets = await db.get_wallets()
     if not wallets:
-        await update.message.reply_text(
-            format_error("No wallets being tracked. Add wallets first with /add"),
-            parse_mode=ParseMode.MARKDOWN_V2,
-        )
+        await _reply_err(update, "No wallets being tracked. Add wallets first with /add")
         return
 
     # Send "searching" message for better UX
-    searching_msg = await update.message.reply_text(
+    searching_msg = await _reply_md2(
+        update,
         f"🔍 Checking {len(wallets)} wallet{'s' if len(wallets) != 1 else ''}\\.\\.\\.",
-        parse_mode=ParseMode.MARKDOWN_V2,
     )
 
-    # Get token info for display
-    token_info = await get_token_info(token_address)
+    # Check which wallets hold this token, while fetching the token info
+    # for display and its price for USD values
+    token_info, token_price, holders = await asyncio.gather(
+        get_token_info(token_address),
+        get_token_price(token_address),
+        helius_client.get_token_holders(token_address, wallets),
+    )
     token_symbol = token_info.symbol if token_info else "UNKNOWN"
 
-    # Get token price for USD values
-    token_price = await get_token_price(token_address)
-
-    # Check which wallets hold this token
-    wallet_list = [{"address": w["address"], "name": w["name"]} for w in wallets]
-    holders = await helius_client.get_token_holders(token_address, wallet_list)
-
     # Format holder data with USD values
     holder_data = []
     for h in holders:
@@ -238,51 +255,102 @@ async def whosinit_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -
             "usd_formatted": format_usd(usd_value) if usd_value else None,
         })
 
-    # Delete the searching message
-    await searching_msg.delete()
-
-    # Send results
-    await update.message.reply_text(
+    # Replace the searching message with the results
+    await searching_msg.edit_text(
         format_whosinit(token_symbol, token_address, holder_data, len(wallets)),
-        parse_mode=ParseMode.MARKDOWN_V2,
+        parse_mode=_MD2,
         disable_web_page_preview=True,
     )
     logger.info(f"Whosinit query for {token_symbol}: {len(holders)}/{len(wallets)} wallets holding")
 
 
+# Command name -> (handler, block); /whosinit can take seconds, so it runs
+# without blocking other handlers
+_COMMANDS = (
+    ("chatid", chatid_command, True),
+    ("start", start_command, True),
+    ("add", add_command, True),
+    ("remove", remove_command, True),
+    ("list", list_command, True),
+    ("rename", rename_command, True),
+    ("whosinit", whosinit_command, False),
+)
+
+
 def create_bot_application() -> Application:
     """Create and configure the Telegram bot application."""
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    global _app
+
+    # Handle updates from different users concurrently
+    application = Application.builder().token(TELEGRAM_BOT_TOKEN).concurrent_updates(True).build()
 
     # Add command handlers
-    application.add_handler(CommandHandler("chatid", chatid_command))
-    application.add_handler(CommandHandler("start", start_command))
-    application.add_handler(CommandHandler("add", add_command))
-    application.add_handler(CommandHandler("remove", remove_command))
-    application.add_handler(CommandHandler("list", list_command))
-    application.add_handler(CommandHandler("rename", rename_command))
-    application.add_handler(CommandHandler("whosinit", whosinit_command))
+    application.add_handlers([
+        CommandHandler(name, callback, block=block) for name, callback, block in _COMMANDS
+    ])
 
+    # Alerts go out through this application's bot and connection pool
+    _app = application
     return application
 
 
-async def send_alert(message: str) -> bool:
-    """Send an alert message to the configured chat."""
-    from telegram import Bot
+def _get_alert_bot() -> Bot:
+    """Get the bot to send alerts with, preferring the application's own."""
+    global _alert_bot
 
+    if _app is not None:
+        return _app.bot
+    if _alert_bot is None:
+        _alert_bot = Bot(token=TELEGRAM_BOT_TOKEN)
+    return _alert_bot
+
+
+async def send_alert(message: str) -> bool:
+    """
+    Queue an alert message for the configured chat.
+    Delivery happens in run_alert_worker(), so callers don't wait on Telegram.
+    """
     if not TELEGRAM_CHAT_ID:
         logger.error("TELEGRAM_CHAT_ID not configured")
         return False
 
-    bot = Bot(token=TELEGRAM_BOT_TOKEN)
+    _alert_queue.put_nowait(message)
+    return True
+
+
+async def _deliver_alert(message: str) -> bool:
+    """Send one alert message to the configured chat, within Telegram's rate limits."""
+    chat_bucket = _chat_buckets.get(TELEGRAM_CHAT_ID)
+    if chat_bucket is None:
+        chat_bucket = _chat_buckets[TELEGRAM_CHAT_ID] = TokenBucket(rate=1, burst=1)
+    # Wait on the chat first so a global token isn't held while waiting
+    await chat_bucket.acquire()
+    await _global_bucket.acquire()
+
     try:
-        await bot.send_message(
+        await _get_alert_bot().send_message(
             chat_id=TELEGRAM_CHAT_ID,
             text=message,
-            parse_mode=ParseMode.MARKDOWN_V2,
+            parse_mode=_MD2,
             disable_web_page_preview=True,
         )
         return True
     except Exception as e:
         logger.error(f"Failed to send alert: {e}")
         return False
+
+
+async def run_alert_worker():
+    """Deliver queued alerts one at a time until cancelled."""
+    global _alert_bot
+
+    try:
+        while True:
+            message = await _alert_queue.get()
+            await _deliver_alert(message)
+    except asyncio.CancelledError:
+        pass
+    finally:
+        if _alert_bot is not None:
+            await _alert_bot.shutdown()
+            _alert_bot = None
@@ -1,6 +1,9 @@
+import asyncio
 import logging
+from collections import OrderedDict
 from typing import Any
-from fastapi import FastAPI, Request, HTTPException
+import orjson
+from fastapi import BackgroundTasks, FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
 
 from .database import db
@@ -8,7 +11,7 @@ from .solana_utils import (
     get_token_info,
     get_token_price,
     calculate_token_amount,
-    SOL_MINT,
+    QUOTE_MINTS,
     STABLECOINS,
 )
 from .formatters import format_buy_alert, format_sell_alert
@@ -19,7 +22,20 @@ logger = logging.getLogger(__name__)
 # Minimum USD value to trigger an alert
 MIN_ALERT_VALUE_USD = 100
 
-app = FastAPI(title="Solana Wallet Tracker Webhook Server")
+# Recently seen signatures, so re-delivered transactions are dropped before
+# any lookups (oldest first, capped at _SEEN_MAX)
+_seen: OrderedDict[str, None] = OrderedDict()
+_SEEN_MAX = 4096
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response serialized with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content)
+
+
+app = FastAPI(title="Solana Wallet Tracker Webhook Server", default_response_class=ORJSONResponse)
 
 
 @app.get("/health")
@@ -29,39 +45,51 @@ async def health_check():
 
 
 @app.post("/helius")
-async def helius_webhook(request: Request):
+async def helius_webhook(request: Request, background: BackgroundTasks):
     """
     Handle incoming Helius webhook notifications.
-    Helius sends an array of enhanced transaction objects.
+    Helius sends an array of enhanced transaction objects. They are processed
+    after the response is sent, so slow lookups or Telegram sends can't make
+    Helius time out and redeliver.
     """
     try:
-        payload = await request.json()
+        payload = orjson.loads(await request.body())
     except Exception as e:
         logger.error(f"Failed to parse webhook payload: {e}")
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
 
-    # Helius sends an array of transactions
-    if not isinstance(payload, list):
-        payload = [payload]
+    # Helius sends an array of transactions, most often holding just one
+    txs = payload if isinstance(payload, list) else (payload,)
+    background.add_task(process_transactions, txs)
+
+    return ORJSONResponse(content={"status": "ok"})
 
-    for tx in payload:
-        await process_transaction(tx)
 
-    return JSONResponse(content={"status": "ok"})
+async def process_transactions(txs: list[dict[str, Any]] | tuple[dict[str, Any], ...]) -> None:
+    """Process the transactions of one webhook delivery."""
+    if len(txs) == 1:
+        await process_transaction(txs[0])
+    else:
+        # Transactions are independent, so process them concurrently;
+        # process_transaction logs its own errors
+        await asyncio.gather(*(process_transaction(tx) for tx in txs))
 
 
 async def process_transaction(tx: dict[str, Any]) -> None:
     """Process a single enhanced transaction from Helius."""
+    signature = None
     try:
         signature = tx.get("signature")
         if not signature:
             logger.warning("Transaction missing signature")
             return
 
-        # Check if we've already processed this transaction
-        if await db.transaction_exists(signature):
-            logger.debug(f"Transaction {signature} already processed")
+        if signature in _seen:
+            logger.debug(f"Transaction {signature} already seen")
             return
+        _seen[signature] = None
+        if len(_seen) > _SEEN_MAX:
+            _seen.popitem(last=False)
 
         # Get transaction type and details
         tx_type = tx.get("type")
@@ -74,6 +102,10 @@ async def process_transaction(tx: dict[str, Any]) -> None:
 
     except Exception as e:
         logger.error(f"Error processing transaction: {e}", exc_info=True)
+        # Helius was acknowledged before processing, so it won't retry and
+        # the transaction is dropped. Forget it in case it is delivered again.
+        logger.error(f"Dropped transaction {signature} after a processing failure")
+        _seen.pop(signature, None)
 
 
 async def process_swap_transaction(tx: dict[str, Any]) -> None:
@@ -81,18 +113,24 @@ async def process_swap_transaction(tx: dict[str, Any]) -> None:
     signature = tx.get("signature")
     fee_payer = tx.get("feePayer")
 
-    # Check if we're tracking this wallet
-    wallet = await db.get_wallet(fee_payer)
-    if not wallet:
-        # Also check account keys for the tracked wallet
-        account_data = tx.get("accountData", [])
-        for account in account_data:
-            account_addr = account.get("account")
-            if account_addr:
-                wallet = await db.get_wallet(account_addr)
-                if wallet:
-                    fee_payer = account_addr
-                    break
+    # Check if we're tracking this wallet, or else any account in the transaction
+    candidates = [fee_payer]
+    candidates += [a["account"] for a in tx.get("accountData", []) if a.get("account")]
+
+    # Most transactions on the shared webhook don't involve a tracked wallet;
+    # reject those against the in-memory address set without awaiting anything
+    if db.tracked_addresses.isdisjoint(candidates):
+        logger.debug(f"Transaction from untracked wallet")
+        return
+
+    tracked = await db.get_wallets_by_addresses(candidates)
+
+    wallet = None
+    for address in candidates:
+        if address in tracked:
+            wallet = tracked[address]
+            fee_payer = address
+            break
 
     if not wallet:
         logger.debug(f"Transaction from untracked wallet")
@@ -113,8 +151,11 @@ async def process_swap_transaction(tx: dict[str, Any]) -> None:
     token_address = swap_info["token_address"]
     amount = swap_info["amount"]
 
-    # Get token info
-    token_info = await get_token_info(token_address)
+    # Get token info and price together
+    token_info, price = await asyncio.gather(
+        get_token_info(token_address),
+        get_token_price(token_address),
+    )
     token_symbol = token_info.symbol if token_info else "UNKNOWN"
     decimals = token_info.decimals if token_info else 9
 
@@ -124,7 +165,6 @@ async def process_swap_transaction(tx: dict[str, Any]) -> None:
 
     # Get USD value
     usd_value = None
-    price = await get_token_price(token_address)
     if price:
         usd_value = amount * price
 
@@ -133,8 +173,8 @@ async def process_swap_transaction(tx: dict[str, Any]) -> None:
         logger.debug(f"Skipping alert for {signature}: value ${usd_value or 0:.2f} below ${MIN_ALERT_VALUE_USD} threshold")
         return
 
-    # Record transaction
-    await db.add_transaction(
+    # Record transaction; a False result means this signature was already processed
+    is_new = await db.add_transaction(
         wallet_address=fee_payer,
         signature=signature,
         tx_type=tx_type,
@@ -143,6 +183,9 @@ async def process_swap_transaction(tx: dict[str, Any]) -> None:
         amount=amount,
         usd_value=usd_value,
     )
+    if not is_new:
+        logger.debug(f"Transaction {signature} already processed")
+        return
 
     # Format and send alert
     if tx_type == "buy":
@@ -166,8 +209,9 @@ async def process_swap_transaction(tx: dict[str, Any]) -> None:
             signature=signature,
         )
 
-    await send_alert(message)
-    logger.info(f"Sent {tx_type} alert for {wallet['name']}: {token_symbol}")
+    # Delivery happens later in the alert worker, which logs its own failures
+    if await send_alert(message):
+        logger.info(f"Queued {tx_type} alert for {wallet['name']}: {token_symbol}")
 
 
 def analyze_swap(
@@ -182,93 +226,75 @@ def analyze_swap(
         dict with keys: type ('buy' or 'sell'), token_address, amount, raw_amount
         or None if cannot determine
     """
-    # Track what the wallet sent and received
-    tokens_sent = []
-    tokens_received = []
+    # Track which mints the wallet sent and received, and per direction the
+    # first (mint, amount) overall and the first that isn't SOL or a stablecoin
+    sent_mints = set()
+    received_mints = set()
+    first_sent = first_received = None
+    first_sent_token = first_received_token = None
+    quote_mints = QUOTE_MINTS
 
     for transfer in token_transfers:
         mint = transfer.get("mint")
-        from_addr = transfer.get("fromUserAccount")
-        to_addr = transfer.get("toUserAccount")
-        amount = transfer.get("tokenAmount", 0)
-
-        if from_addr == wallet_address:
-            tokens_sent.append({
-                "mint": mint,
-                "amount": amount,
-            })
-        elif to_addr == wallet_address:
-            tokens_received.append({
-                "mint": mint,
-                "amount": amount,
-            })
+        if transfer.get("fromUserAccount") == wallet_address:
+            sent_mints.add(mint)
+            if first_sent is None:
+                first_sent = (mint, transfer.get("tokenAmount", 0))
+            if first_sent_token is None and mint not in quote_mints:
+                first_sent_token = (mint, transfer.get("tokenAmount", 0))
+        elif transfer.get("toUserAccount") == wallet_address:
+            received_mints.add(mint)
+            if first_received is None:
+                first_received = (mint, transfer.get("tokenAmount", 0))
+            if first_received_token is None and mint not in quote_mints:
+                first_received_token = (mint, transfer.get("tokenAmount", 0))
 
     # Skip stablecoin-to-stablecoin swaps (USDC <-> USDT, etc.)
-    sent_mints = {t["mint"] for t in tokens_sent}
-    received_mints = {t["mint"] for t in tokens_received}
-
-    # If all sent tokens are stablecoins AND all received tokens are stablecoins, skip
     if sent_mints and received_mints:
-        all_sent_stable = all(mint in STABLECOINS for mint in sent_mints)
-        all_received_stable = all(mint in STABLECOINS for mint in received_mints)
-        if all_sent_stable and all_received_stable:
+        # If all sent tokens are stablecoins AND all received tokens are stablecoins, skip
+        if sent_mints.issubset(STABLECOINS) and received_mints.issubset(STABLECOINS):
             logger.debug(f"Skipping stablecoin-to-stablecoin swap")
             return None
 
-    # Check native SOL transfers
+    # Determine swap type
+    # Buy: wallet sends SOL (or stablecoin), receives token
+    # Sell: wallet sends token, receives SOL (or stablecoin)
+
+    # If received a non-SOL/stablecoin token -> BUY
+    if first_received_token is not None:
+        return _swap_result("buy", first_received_token)
+
+    # If sent a non-SOL/stablecoin token -> SELL
+    if first_sent_token is not None:
+        return _swap_result("sell", first_sent_token)
+
+    # Otherwise fall back to the direction of native SOL transfers
     sol_sent = 0
     sol_received = 0
 
     for transfer in native_transfers:
-        from_addr = transfer.get("fromUserAccount")
-        to_addr = transfer.get("toUserAccount")
         amount = transfer.get("amount", 0)
-
-        if from_addr == wallet_address:
+        if transfer.get("fromUserAccount") == wallet_address:
             sol_sent += amount
-        elif to_addr == wallet_address:
+        elif transfer.get("toUserAccount") == wallet_address:
             sol_received += amount
 
-    # Determine swap type
-    # Buy: wallet sends SOL (or stablecoin), receives token
-    # Sell: wallet sends token, receives SOL (or stablecoin)
-
-    # If received a non-SOL token and sent SOL/stablecoin -> BUY
-    for received in tokens_received:
-        if received["mint"] != SOL_MINT:
-            return {
-                "type": "buy",
-                "token_address": received["mint"],
-                "amount": received["amount"],
-                "raw_amount": None,
-            }
-
-    # If sent a non-SOL token and received SOL/stablecoin -> SELL
-    for sent in tokens_sent:
-        if sent["mint"] != SOL_MINT:
-            return {
-                "type": "sell",
-                "token_address": sent["mint"],
-                "amount": sent["amount"],
-                "raw_amount": None,
-            }
-
-    # If only SOL transfers, check direction
-    if sol_received > sol_sent and tokens_sent:
+    if sol_received > sol_sent and first_sent is not None:
         # Sold tokens for SOL
-        return {
-            "type": "sell",
-            "token_address": tokens_sent[0]["mint"],
-            "amount": tokens_sent[0]["amount"],
-            "raw_amount": None,
-        }
-    elif sol_sent > sol_received and tokens_received:
+        return _swap_result("sell", first_sent)
+    elif sol_sent > sol_received and first_received is not None:
         # Bought tokens with SOL
-        return {
-            "type": "buy",
-            "token_address": tokens_received[0]["mint"],
-            "amount": tokens_received[0]["amount"],
-            "raw_amount": None,
-        }
+        return _swap_result("buy", first_received)
 
     return None
+
+
+def _swap_result(tx_type: str, transfer: tuple[str, Any]) -> dict[str, Any]:
+    """Build analyze_swap's result from a (mint, amount) pair."""
+    mint, amount = transfer
+    return {
+        "type": tx_type,
+        "token_address": mint,
+        "amount": amount,
+        "raw_amount": None,
+    }